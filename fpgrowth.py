@@ -11,11 +11,11 @@ rule learning, including support, confidence, life, conviction, leverage,
 collective strength, and all-confidence [4]. However, this implementation only
 uses support which has the downward closure property.
 
-This implementation uses a recursive rather than iterative approach to searching
-the space of possible projected trees. One of the tradeoffs here is that the
-recursive approach can take up a lot of memory compared to iteratively-
-generating the trees. Python has a recursion depth limit, meaning that a
-function can only occur on the current call stack a finite number of times.
+This implementation searches the space of possible projected trees depth-first
+with an explicit stack rather than by recursion, so it is not limited by Python's
+recursion depth limit. Only the projected trees along the current branch of the
+search are held in memory at once. Since the projected trees of distinct frequent
+items are independent, the search can also be spread over several processes.
 
 GNU General Public License v3.0
 Permissions of this strong copyleft license are conditioned on making available complete source
@@ -59,6 +59,8 @@ __status__ = 'School Project'
 # Standard Imports
 import argparse
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from time import ctime
 
 def get_db_size(file_name):
@@ -97,10 +99,7 @@ def clean_line(line):
         t_set (frozenset[int]): The set of items as integers in the transaction.
     '''
     t_id, t_n, t_set = line.rstrip().split('\t')
-    t_id = int(t_id)
-    t_n = int(t_n)
-    t_set = frozenset([int(i) for i in t_set.split(' ')])
-    return t_id, t_n, t_set
+    return int(t_id), int(t_n), frozenset(map(int, t_set.split()))
 
 def scan_db(file_name):
     '''
@@ -117,11 +116,9 @@ def scan_db(file_name):
         (int, int, set[int]): Transaction from transaction database file.
     '''
     with open(file_name) as file_io:
-        for i, line in enumerate(file_io):
-            if i != 0:
-                yield clean_line(line)
-            else:
-                continue
+        next(file_io, None)
+        for line in file_io:
+            yield clean_line(line)
 
 def first_scan(file_name, epsilon):
     '''
@@ -132,25 +129,46 @@ def first_scan(file_name, epsilon):
     assume that all items are candidates while later_scan
     will assume that the candidates are provided.
 
+    The transactions are only counted, not kept, so the
+    database is not held in memory.
+
     ARGUMENTS
         file_name (str): The name of the transaction database file.
         epsilon (float/int): Absolute minimum support threshold.
 
     RETURNS
-        (dict): A support table of each item in the database.
+        (dict): A support table of the frequent items in the database,
+            in order of descending support.
     '''
-    supporter = Counter()
-    transactions = []
+    supporter = Counter(chain.from_iterable(t_line[-1] for t_line in scan_db(file_name)))
+    return {k: v for k, v in sorted(supporter.items(),
+                                    key=lambda item: item[1],
+                                    reverse=True) if v >= epsilon}
+
+def second_scan(file_name, l_table):
+    '''
+    This generator performs the second database scan,
+    which yields each transaction restricted to the frequent
+    items and sorted by descending support as FP-tree
+    insertion requires.
+
+    Items are remapped to their rank in the support table, so
+    item i of a transaction is the key at position i of l_table.
+
+    ARGUMENTS
+        file_name (str): The name of the transaction database file.
+        l_table (dict): The support table returned by first_scan.
+
+    RETURNS
+        (generator object)
+
+    YIELDS
+        (tuple[int]): Ranks of the frequent items in a transaction.
+    '''
+    rank = {item: i for i, item in enumerate(l_table)}
+    frequent = frozenset(rank)
     for t_line in scan_db(file_name):
-        t_set = t_line[-1]
-        transactions.append(t_set)
-        supporter += Counter(t_set)
-    l_table = {k: v for k, v in sorted(supporter.items(),
-                                       key=lambda item: item[1],
-                                       reverse=True) if v >= epsilon}
-    transactions = [frozenset([item for item in trans if item in l_table.keys()])\
-                    for trans in transactions]
-    return l_table, transactions
+        yield tuple(sorted(map(rank.__getitem__, t_line[-1] & frequent)))
 
 
 class FPNode:
@@ -161,8 +179,22 @@ class FPNode:
     linked both by parent-child edges but also by
     additional edges that I have termed "links". The
     the set of all links induces a graph of what I call
-    the hyperlinks.
+    the hyperlinks. The FPTree keeps the hyperlinks as
+    a list of the nodes of each item, so a node does not
+    store its own link.
+
+    Nodes are declared with __slots__ since a tree holds
+    many of them, which avoids a per-instance __dict__.
+
+    Most nodes have few children, so the children are stored
+    according to the fanout of the node: None for a leaf, the
+    child itself for a single child, a list of children that is
+    scanned linearly for a small fanout, and a dictionary keyed
+    by item once the fanout exceeds _max_list_children.
     '''
+    __slots__ = ('tree', 'item', 'support', 'parent', 'children')
+    _max_list_children = 8
+
     def __init__(self, tree, item, support=1):
         '''
         ARGUMENTS
@@ -177,8 +209,7 @@ class FPNode:
         self.item = item
         self.support = support
         self.parent = None
-        self.children = {}
-        self._link = None
+        self.children = None
 
     def add(self, child):
         """
@@ -192,36 +223,57 @@ class FPNode:
                 None
         """
 
-        if not child.item in self.children:
-            self.children[child.item] = child
-            child.parent = self
+        if self.search(child.item) is not None:
+            return
+        children = self.children
+        if children is None:
+            self.children = child
+        elif isinstance(children, FPNode):
+            self.children = [children, child]
+        elif isinstance(children, list):
+            if len(children) < self._max_list_children:
+                children.append(child)
+            else:
+                self.children = {node.item: node for node in children}
+                self.children[child.item] = child
+        else:
+            children[child.item] = child
+        child.parent = self
 
     def search(self, item):
         '''
-        This function returns the children of a given
-        node if the item exists in the children keys.
+        This function returns the child of a given
+        node if the item exists among its children.
 
         ARGUMENTS
             item (int): Query item.
 
         RETURNS
-            self.children[item]: Children associated with item.
+            (FPNode[object]): Child associated with item, or None.
         '''
-        if item in self.children.keys():
-            return self.children[item]
-        return None
-
-    def increment_node_support(self):
+        children = self.children
+        if children is None:
+            return None
+        if isinstance(children, FPNode):
+            return children if children.item == item else None
+        if isinstance(children, list):
+            for child in children:
+                if child.item == item:
+                    return child
+            return None
+        return children.get(item)
+
+    def increment_node_support(self, count=1):
         '''
         This method increments the support of the item this node represents.
 
         ARGUMENTS
-            None
+            count (int): Amount to increment the support by (default: 1).
 
         RETURNS
             None
         '''
-        self.support += 1
+        self.support += count
 
     @property
     def root(self):
@@ -240,69 +292,51 @@ class FPNode:
         '''
         return self.item is None and self.support is None
 
-    @property
-    def link(self):
-        '''
-        This method gives the next node in the
-        hyperlinked graph.
-
-        ARGUMENTS
-            None
-
-        RETURNS
-            _link (int): Next node in hyperlink graph.
-        '''
-        return self._link
-
-    @link.setter
-    def link(self, value):
-        '''
-        This method sets the next node in the hyperlinked
-        graph.
-
-        ARGUMENTS
-            value (int): Node query.
-
-        RETURNS
-            None
-        '''
-        self._link = value
-
 class FPTree:
     '''
     This class defines the frequent pattern trees used for the
     FP growth algorithm. This class is used for both the initial tree,
     as well as the subsequent projected trees.
     '''
+    __slots__ = ('root', 'hyperlinks', 'item_support')
 
     def __init__(self):
         '''
         This initialization sets the root of the tree to have None
         for item and None for count. It also initializes the hyperlink
         dictionary that keeps track of the links between nodes that are
-        not formally parent:child relationships.
+        not formally parent:child relationships, as a list of the nodes
+        of each item in order of insertion, and a running total
+        of the support of each item across all of its nodes.
         '''
         self.root = FPNode(self, None, None)
         self.hyperlinks = {}
+        self.item_support = Counter()
 
-    def add_transaction(self, itemset):
+    def add_transaction(self, itemset, count=1):
         """
         This method adds a transaction to the prefix tree.
 
         ARGUEMNTS
             itemset (iterable[int]): transaction to be added to prefix tree.
+            count (int): Number of times the transaction occurs (default: 1).
 
         RETURNS
             None
         """
+        # This is the hot loop of tree construction, so the support
+        # increment is done inline rather than through
+        # FPNode.increment_node_support.
         point = self.root
+        item_support = self.item_support
 
         for item in itemset:
+            item_support[item] += count
             next_point = point.search(item)
-            if next_point:
-                next_point.increment_node_support()
+            if next_point is not None:
+                next_point.support += count
             else:
-                next_point = FPNode(self, item)
+                next_point = FPNode(self, item, count)
                 point.add(next_point)
                 self.update_route(next_point)
             point = next_point
@@ -313,17 +347,16 @@ class FPTree:
         nodes that form a connected path to it.
 
         ARGUMENTS
-            point (int): An item to extend to.
+            point (FPNode[object]): A node to extend to.
 
         RETURNS
             None
         """
-        if point.item in self.hyperlinks.keys():
-            route = self.hyperlinks[point.item]
-            route[1].link = point
-            self.hyperlinks[point.item] = route[0], point
+        route = self.hyperlinks.get(point.item)
+        if route is None:
+            self.hyperlinks[point.item] = [point]
         else:
-            self.hyperlinks[point.item] = (point, point)
+            route.append(point)
 
     def items(self):
         '''
@@ -333,19 +366,22 @@ class FPTree:
         but a given node is associated with only one
         item.
 
+        The nodes are yielded as the hyperlink list itself,
+        so they can be traversed more than once without
+        walking the hyperlinks again.
+
         ARGUMENTS
             None
 
         RETURNS
-            (generator object)
+            (iterator)
 
         YIELDS
-            (item, node)
+            (item, nodes)
                 item (int): An item in the tree.
-                node (int): A node in the tree.
+                nodes (list[FPNode]): The nodes of the item in the tree.
         '''
-        for item in self.hyperlinks:
-            yield item, self.nodes(item)
+        return iter(self.hyperlinks.items())
 
     def nodes(self, item):
         '''
@@ -353,18 +389,14 @@ class FPTree:
             item (int): Initial node in hyperlink graph.
 
         RETURNS
-            (generator object)
+            (iterator)
 
         YIELDS
             node (FPNode): Next node in hyperlink path.
         '''
-        if item in self.hyperlinks:
-            node = self.hyperlinks[item][0]
-        while node:
-            yield node
-            node = node.link
+        return iter(self.hyperlinks.get(item, ()))
 
-    def prefix_paths(self, item):
+    def prefix_paths(self, nodes):
         '''
         This method gets the paths
 
@@ -373,32 +405,59 @@ class FPTree:
             the parent:child relations.
 
         ARGUMENTS
-            item (int): An item in the FPTree.
+            nodes (iterable[FPNode]): The nodes of an item in the FPTree, as given by items or nodes.
 
         RETURNS
             All paths for that contain a nodes for a given item.
         '''
         paths = []
-        for node in self.nodes(item):
+        for node in nodes:
             path = []
-            while not node.root and node:
-                path = [node] + path
+            while node is not None and not node.root:
+                path.append(node)
                 node = node.parent
+            path.reverse()
             paths.append(path)
         return paths
 
+    def conditional_base(self, nodes):
+        '''
+        This method gets the conditional pattern base of an item,
+        which is the prefix path above each node of the item paired
+        with the support of that node. The paths are walked directly
+        rather than through prefix_paths, so no lists of nodes are
+        built along the way.
+
+        ARGUMENTS
+            nodes (iterable[FPNode]): The nodes of an item in the FPTree, as given by items or nodes.
+
+        RETURNS
+            (list[tuple[list[int], int]]): The items on each prefix path and its support.
+        '''
+        pattern_base = []
+        for node in nodes:
+            support = node.support
+            items = []
+            node = node.parent
+            while node is not None and not node.root:
+                items.append(node.item)
+                node = node.parent
+            items.reverse()
+            pattern_base.append((items, support))
+        return pattern_base
+
 def fp_search(tree, epsilon, suffix=None):
     '''
-    This function performs a recursive search
+    This function performs a depth-first search
     through the space of projected trees, and limits
     the scope of the search by checking for the support
     of the trees in the itemset it represents. It also
     yields the frequent itemsets while the search is
     being performed.
 
-    WARNING: It is possible to go over Python's built-in
-    recursion depth limit using this function. Whether this
-    happens will depend upon the size of the dataset.
+    The search keeps an explicit stack of the projected
+    trees along the current branch rather than recursing,
+    so its depth is not bounded by Python's recursion limit.
 
     ARGUMENTS
         tree (FPTree[object]): An FPTree (initial, or projected).
@@ -413,58 +472,104 @@ def fp_search(tree, epsilon, suffix=None):
         tree_support (int): Support of items in current tree.
     '''
     suffix = [] if suffix is None else suffix
-    for item, nodes in tree.items():
-        tree_support = sum(n.support for n in nodes)
-        if tree_support >= epsilon and item not in suffix:
-            freq_items = [item] + suffix
-            yield freq_items, tree_support
-            proj_tree = project(tree.prefix_paths(item))
-            for freq_items, tree_support in fp_search(proj_tree, epsilon, freq_items):
+    work = [(tree, suffix, tree.items())]
+    while work:
+        tree, suffix, items = work[-1]
+        for item, nodes in items:
+            tree_support = tree.item_support[item]
+            if tree_support >= epsilon:
+                freq_items = [item] + suffix
                 yield freq_items, tree_support
+                proj_tree = project(tree.conditional_base(nodes), epsilon)
+                work.append((proj_tree, freq_items, proj_tree.items()))
+                break
         else:
-            continue
+            work.pop()
+
+def search_base(pattern_base, epsilon, suffix):
+    '''
+    This function projects a conditional pattern base
+    into a tree and returns every frequent itemset found
+    by searching it. It is the unit of work handed to each
+    worker process by parallel_search.
+
+    ARGUMENTS
+        pattern_base (list[tuple[list[int], int]]): Conditional pattern base of the suffix.
+        epsilon (int): The minimum support threshold.
+        suffix (list[int]): The suffix the pattern base is conditioned on.
+
+    RETURNS
+        (list[tuple[list[int], int]]): Frequent itemsets and their supports.
+    '''
+    return list(fp_search(project(pattern_base, epsilon), epsilon, suffix))
+
+def parallel_search(tree, epsilon, jobs):
+    '''
+    This function performs the same search as fp_search,
+    but spreads the work over a pool of processes. The
+    projected trees of distinct frequent items in the
+    initial tree are searched independently of each other,
+    so the conditional pattern base of each such item is
+    sent to a worker process.
+
+    ARGUMENTS
+        tree (FPTree[object]): The initial FPTree.
+        epsilon (int): The minimum support threshold.
+        jobs (int): Number of worker processes.
+
+    RETURNS
+        (generator object)
+
+    YIELDS
+        freq_items (list): Frequent items discovered in search.
+        tree_support (int): Support of items in current tree.
+    '''
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for item, nodes in tree.items():
+            tree_support = tree.item_support[item]
+            if tree_support >= epsilon:
+                yield [item], tree_support
+                futures.append(pool.submit(search_base,
+                                           tree.conditional_base(nodes),
+                                           epsilon,
+                                           [item]))
+        for future in futures:
+            for freq_items, tree_support in future.result():
+                yield freq_items, tree_support
 
-def project(paths):
+def project(pattern_base, epsilon):
     '''
     This function constructs a projected tree
-    given the item paths from a 'parent tree'.
+    given the conditional pattern base from a 'parent tree'.
+
+    The pattern base is scanned twice. The first pass counts
+    the conditional support of each item. The second pass
+    inserts each path into the new tree keeping only the items
+    that are frequent in the conditional pattern base, in order
+    of descending conditional support.
 
     ARGUMENTS
-        paths (iterable): The sequence of items from another tree.
+        pattern_base (iterable): Pairs of item sequences and their supports from another tree.
+        epsilon (int): The minimum support threshold.
 
     RETURNS
         tree (FPTree[object]): A FPTree object projected by the given item sequence.
     '''
-    itemset = set()
-    seed = False
-    new_tree = FPTree()
+    cond_supp = Counter()
+    for items, support in pattern_base:
+        for item in items:
+            cond_supp[item] += support
 
-    for path in paths:
-        if not bool(seed):
-            seed = path[-1].item
-        else:
-            pass
-
-        current_node = new_tree.root
-        for node in path:
-            next_current_node = current_node.search(node.item)
-            if not next_current_node:
-                itemset.add(node.item)
-                if node.item == seed:
-                    support = node.support
-                else:
-                    support = 0
-                next_current_node = FPNode(new_tree, node.item, support)
-                current_node.add(next_current_node)
-                new_tree.update_route(next_current_node)
-            else:
-                pass
-            current_node = next_current_node
+    rank = {item: i for i, (item, support) in enumerate(cond_supp.most_common())
+            if support >= epsilon}
+    new_tree = FPTree()
 
-    for path in new_tree.prefix_paths(seed):
-        support = path[-1].support
-        for node in path[:-1][::-1]:
-            node.support += support
+    for items, support in pattern_base:
+        itemset = sorted((item for item in items if item in rank),
+                         key=rank.__getitem__)
+        if itemset:
+            new_tree.add_transaction(itemset, support)
 
     return new_tree
 
@@ -475,26 +580,20 @@ def write_rules(file_out, rules):
 
     ARGUMENTS
         file_out (str): The output file name of frequent patterns.
-        rules (dict[frozenset[int]:int]): Dictionary of all frequent patterns found by the algorithm.
+        rules (dict[tuple[int]:int]): Dictionary of all frequent patterns found by the algorithm.
 
     RETURNS
         None
     '''
-    with open(file_out, 'w') as file:
-        count = 0
-        lines = []
-        for (itemset, support) in rules.items():
-            count += 1
-            if isinstance(itemset, int):
-                itemstr = str(itemset)
-            else:
-                itemstr = str(set(itemset)).replace('{', '').replace('}', '')
-            line = f'{itemstr} : {support}\n'
-            lines.append(line)
+    lines = []
+    for (itemset, support) in rules.items():
+        itemstr = ', '.join(map(str, itemset))
+        lines.append(f'{itemstr} : {support}\n')
+    count = len(lines)
+    with open(file_out, 'w', buffering=1 << 20) as file:
         file.write(f'|FPs| = {count}\n')
-        print(f'|FPs| = {count}\n')
-        for line in lines:
-            file.write(line)
+        file.write(''.join(lines))
+    print(f'|FPs| = {count}\n')
 
 if __name__ == '__main__':
     # Prepare command line PARSER
@@ -521,30 +620,36 @@ if __name__ == '__main__':
                         type=float,
                         default=0.5,
                         help="Minimum support threshold as a float between 0 and 1. (default=0.5)")
+    PARSER.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=1,
+                        help="Number of processes used to search for frequent patterns. (default=1)")
     ARGS = PARSER.parse_args()
 
     # Check validity of CLI arguments
     assert 0 <= ARGS.min_supp <= 1
+    assert ARGS.jobs >= 1
     EPSILON = ARGS.min_supp * get_db_size(ARGS.in_file)
 
     print(ctime(), 'Performing first database scan...')
-    L1, TRANSACTIONS = first_scan(ARGS.in_file, EPSILON)
+    L1 = first_scan(ARGS.in_file, EPSILON)
 
     START_TREE = FPTree()
 
     print(ctime(), 'Building initial tree...')
-    for transaction in TRANSACTIONS:
+    for transaction in second_scan(ARGS.in_file, L1):
         START_TREE.add_transaction(transaction)
 
-    del TRANSACTIONS
-
     print(ctime(), 'Finding frequent patterns...')
+    ITEMS = tuple(L1)
     RULES = {}
-    for fset in fp_search(START_TREE, EPSILON):
-        if len(fset[0]) == 1:
-            RULES[frozenset((fset[0][0], ))] = fset[1]
-        else:
-            RULES[frozenset(fset[0])] = fset[1]
+    if ARGS.jobs > 1:
+        PATTERNS = parallel_search(START_TREE, EPSILON, ARGS.jobs)
+    else:
+        PATTERNS = fp_search(START_TREE, EPSILON)
+    for fset in PATTERNS:
+        RULES[tuple(sorted(ITEMS[i] for i in fset[0]))] = fset[1]
 
     print(ctime(), 'Writing frequent patterns to file...')
     write_rules(ARGS.out_file, RULES)